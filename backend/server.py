@@ -9,12 +9,24 @@ Master Token の取得方法は README.md を参照。
 """
 
 import os
-import json
+import functools
+import hashlib
 import logging
-from flask import Flask, jsonify, request
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from flask import Flask, Response, jsonify, request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
 from flask_cors import CORS
 import gkeepapi
+import orjson
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 
 # .env ファイルが存在する場合は環境変数として読み込む（ローカル開発用）
 # Render / Railway などのホスティング環境ではダッシュボードで設定した環境変数が優先される
@@ -26,6 +38,19 @@ logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 
+
+class _OrjsonProvider(DefaultJSONProvider):
+    """jsonify のエンコードを orjson（C 実装）で行う JSON プロバイダ。"""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+app.json = _OrjsonProvider(app)
+
 # フロントエンド（Vite dev server / Railway / Render）からのリクエストを許可
 # FRONTEND_ORIGIN 環境変数にフロントエンドの URL を設定してください。
 # 複数指定する場合はカンマ区切り（例: https://a.up.railway.app,https://b.onrender.com）
@@ -33,32 +58,200 @@ _frontend_origins = [
     "http://localhost:5173",
     "http://localhost:4173",
     "http://127.0.0.1:5173",
+] + [
+    _origin.strip().rstrip("/")  # 末尾のスラッシュを除去（空要素は無視）
+    for _origin in os.environ.get("FRONTEND_ORIGIN", "").split(",")
+    if _origin.strip()
 ]
-_extra = os.environ.get("FRONTEND_ORIGIN", "")
-for _origin in _extra.split(","):
-    _origin = _origin.strip().rstrip("/")  # 末尾のスラッシュを除去
-    if _origin:
-        _frontend_origins.append(_origin)
 
 CORS(app, origins=_frontend_origins)
 
+# クエリパラメータとして真と解釈する値
+_TRUE_VALUES = frozenset({"1", "true", "yes", "on"})
+
+
+def _bool_arg(name: str) -> bool:
+    """クエリパラメータを真偽値として解釈する（デフォルト: False）。"""
+    return request.args.get(name, "").lower() in _TRUE_VALUES
+
 # ---- Keep クライアントのシングルトン ----
-_keep: gkeepapi.Keep | None = None
+# スレッド実行時（gunicorn gthread / app.run(threaded=True)）に
+# 認証と keep.sync() が競合しないようにするロック。
+# シリアライズ済みキャッシュの読み出しはロック不要。
+_keep_lock = threading.RLock()
+
+# ---- シリアライズ済みノートのキャッシュ ----
+# note.id -> (更新日時, JSON バイト列)
+# ノートの内容は keep.sync() 後にしか変化しないため、更新日時が進んでいない
+# ノートは再シリアライズせずキャッシュ済みのバイト列をそのまま使い回す。
+# ネストした dict ではなく orjson 済みのバイト列を保持することで、
+# キャッシュヒット時はレスポンスへの連結だけで済み、メモリも小さい。
+_note_cache: dict[str, tuple[datetime | None, bytes]] = {}
+
+# ---- 状態ファイルの非同期書き込み ----
+# keep.dump() のディスク書き込みはレスポンスをブロックしないよう
+# バックグラウンドスレッドで行う。書き込み中に次の同期が来た場合は
+# _pending_dump が差し替えられ、最新の 1 回分だけがまとめて書き込まれる。
+#
+# 書き込みはスナップショット + デルタログ方式:
+# 毎回全ノートを書き直すのではなく、前回書き込みから変化したノードだけを
+# <state_file>.log.jsonl に 1 行ずつ追記し、_COMPACT_EVERY 回溜まったら
+# スナップショットに統合してログを空にする。復元時はスナップショットを
+# 読んでからログを順に適用する。
+_writer_lock = threading.Lock()
+_pending_dump: dict | None = None
+_write_event = threading.Event()
+
+_COMPACT_EVERY = 100  # デルタをこの回数追記したらスナップショットへ統合する
+
+# 以下はライタースレッドのみが触る状態
+_last_written_nodes: dict[str, dict] | None = None  # None = スナップショット未作成
+_last_written_version: str | None = None
+_log_append_count = 0
+
+
+def _state_file_path() -> str:
+    return os.environ.get("KEEP_STATE_FILE", "keep_state.json")
+
+
+def _write_snapshot(dump: dict, state_file: str, log_file: str) -> None:
+    """スナップショットをアトミックに書き出し、デルタログを空にする。"""
+    tmp = state_file + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(orjson.dumps(dump))
+    # クラッシュしても状態ファイルが壊れないよう、アトミックに差し替える
+    os.replace(tmp, state_file)
+    open(log_file, "wb").close()
+    logger.info("キャッシュを保存: %s", state_file)
+
+
+def _write_state(dump: dict) -> None:
+    """前回書き込みとの差分に応じてスナップショットまたはデルタを書き出す。"""
+    global _last_written_nodes, _last_written_version, _log_append_count
+    state_file = _state_file_path()
+    log_file = state_file + ".log.jsonl"
+    nodes = {node["id"]: node for node in dump.get("nodes", [])}
+    version = dump.get("keep_version")
+
+    if _last_written_nodes is None or _log_append_count >= _COMPACT_EVERY:
+        _write_snapshot(dump, state_file, log_file)
+        _log_append_count = 0
+    else:
+        put = [n for nid, n in nodes.items() if _last_written_nodes.get(nid) != n]
+        removed = [nid for nid in _last_written_nodes if nid not in nodes]
+        if not put and not removed and version == _last_written_version:
+            return  # 前回書き込みから何も変わっていない
+        delta = {
+            "keep_version": version,
+            "labels": dump.get("labels"),
+            "put": put,
+            "del": removed,
+        }
+        with open(log_file, "ab") as f:
+            f.write(orjson.dumps(delta) + b"\n")
+        _log_append_count += 1
+        logger.info("デルタを追記: 更新 %d 件 / 削除 %d 件", len(put), len(removed))
+
+    _last_written_nodes = nodes
+    _last_written_version = version
+
+
+def _load_state(state_file: str) -> dict:
+    """スナップショットを読み、デルタログがあれば順に適用して状態を復元する。"""
+    with open(state_file, "rb") as f:
+        state = orjson.loads(f.read())
+
+    log_file = state_file + ".log.jsonl"
+    if not os.path.exists(log_file):
+        return state
+
+    nodes = {node["id"]: node for node in state.get("nodes", [])}
+    with open(log_file, "rb") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                delta = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                # クラッシュで途切れた書きかけの行以降は捨てる
+                break
+            state["keep_version"] = delta.get("keep_version", state.get("keep_version"))
+            if delta.get("labels") is not None:
+                state["labels"] = delta["labels"]
+            for node in delta.get("put", []):
+                nodes[node["id"]] = node
+            for node_id in delta.get("del", []):
+                nodes.pop(node_id, None)
+    state["nodes"] = list(nodes.values())
+    return state
+
+
+def _state_writer_loop() -> None:
+    """_pending_dump を状態ファイルへ書き出し続けるループ。"""
+    global _pending_dump
+    while True:
+        _write_event.wait()
+        _write_event.clear()
+        with _writer_lock:
+            dump = _pending_dump
+            _pending_dump = None
+        if dump is None:
+            continue
+        try:
+            _write_state(dump)
+        except OSError as e:
+            logger.error("キャッシュの保存に失敗: %s", e)
+
+
+_writer_thread = threading.Thread(target=_state_writer_loop, daemon=True)
+_writer_thread.start()
+
+
+def _schedule_state_write(keep: gkeepapi.Keep) -> None:
+    """同期後の keep.dump() をバックグラウンド書き込みに渡す。"""
+    global _pending_dump
+    with _writer_lock:
+        _pending_dump = keep.dump()
+    _write_event.set()
 
 
+@functools.lru_cache(maxsize=1)
 def get_keep() -> gkeepapi.Keep:
     """
     gkeepapi.Keep インスタンスを返す（初回のみ認証）。
 
+    認証済みインスタンスは lru_cache（C 実装）に保持される。認証に失敗した
+    呼び出しはキャッシュされないため、次のリクエストで再試行される。
+    再認証が必要になった場合は get_keep.cache_clear() を呼ぶこと。
+
     環境変数:
         KEEP_EMAIL       : Google アカウントのメールアドレス
         KEEP_MASTER_TOKEN: Master Token（aas_et/... 形式）
         KEEP_STATE_FILE  : ノートキャッシュファイルのパス（省略可、デフォルト: keep_state.json）
     """
-    global _keep
-    if _keep is not None:
-        return _keep
+    with _keep_lock:
+        return _authenticate_keep()
+
+
+def _configure_http_sessions(keep: gkeepapi.Keep) -> None:
+    """
+    gkeepapi 内部の requests.Session にコネクションプールとリトライを設定する。
+
+    接続を使い回すことで同期毎の TLS ハンドシェイクを省き、
+    一時的な 5xx はリトライで吸収する。
+    """
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=retry)
+    # _keep_api などは gkeepapi の内部属性のため、存在を確認してから触る
+    for attr in ("_keep_api", "_media_api", "_reminders_api"):
+        session = getattr(getattr(keep, attr, None), "_session", None)
+        if session is not None:
+            session.mount("https://", adapter)
+
 
+def _authenticate_keep() -> gkeepapi.Keep:
+    """環境変数から認証情報を読み、Keep クライアントを初期化する。"""
     email = os.environ.get("KEEP_EMAIL")
     master_token = os.environ.get("KEEP_MASTER_TOKEN")
 
@@ -68,55 +261,251 @@ def get_keep() -> gkeepapi.Keep:
             " Master Token の取得方法は README.md を参照してください。"
         )
 
-    state_file = os.environ.get("KEEP_STATE_FILE", "keep_state.json")
+    state_file = _state_file_path()
 
     keep = gkeepapi.Keep()
+    _configure_http_sessions(keep)
 
     # キャッシュファイルが存在する場合はリストアしてから認証（高速化）
     if os.path.exists(state_file):
         logger.info("キャッシュファイルからノート状態を復元: %s", state_file)
-        with open(state_file, "r", encoding="utf-8") as f:
-            state = json.load(f)
+        state = _load_state(state_file)
         keep.authenticate(email, master_token, state=state)
     else:
         logger.info("Google Keep に接続中...")
         keep.authenticate(email, master_token)
 
     logger.info("Google Keep への認証成功")
-    _keep = keep
+    _rebuild_note_index(keep)
     return keep
 
 
+# ---- 起動時ウォームアップ ----
+# 初回リクエストに認証＋状態復元の数秒を払わせないよう、
+# 起動直後にバックグラウンドで認証を済ませておく。
+_keep_ready = threading.Event()
+
+
+def _warm_up_keep() -> None:
+    try:
+        get_keep()
+    except Exception as e:
+        # 認証情報未設定などのエラーはリクエスト時に改めて報告されるため、
+        # ここではログに残すだけでよい
+        logger.warning("ウォームアップ認証に失敗: %s", e)
+    finally:
+        _keep_ready.set()
+
+
+def _retry_later_response() -> Response:
+    """ウォームアップが終わっていない場合の 503 レスポンスを作る。"""
+    response = jsonify({"error": "準備中です。しばらくしてから再試行してください。"})
+    response.status_code = 503
+    response.headers["Retry-After"] = "2"
+    return response
+
+
+# datetime.isoformat() の結果のメモ化。gkeepapi は再同期されるまで同じ
+# datetime インスタンスを使い回すため、id() をキーにでき、同期時に破棄すればよい。
+_iso_cache: dict[int, str] = {}
+
+
+def _iso(dt: datetime | None) -> str:
+    """datetime を ISO 8601 文字列にする（None は空文字列、結果はメモ化）。"""
+    if dt is None:
+        return ""
+    return _iso_cache.setdefault(id(dt), dt.isoformat())
+
+
+def _note_body_text(note) -> dict:
+    """テキストノートの body 部を作る。"""
+    return {"text": {"text": note.text or ""}}
+
+
+def _note_body_list(note) -> dict:
+    """チェックリストノートの body 部を作る。"""
+    return {"list": {"listItems": [
+        {"text": {"text": item.text}, "checked": item.checked}
+        for item in note.items
+    ]}}
+
+
+# type() で直接引くディスパッチテーブル（isinstance の MRO 走査を省く）
+_BODY_SERIALIZERS = {
+    gkeepapi.node.Note: _note_body_text,
+    gkeepapi.node.List: _note_body_list,
+}
+
+
 def _serialize_note(note) -> dict:
     """
     gkeepapi の Note / List オブジェクトをフロントエンド互換の dict に変換する。
 
     フロントエンドの keep-api.ts の Note 型に合わせた形式で返す。
     """
-    is_list = isinstance(note, gkeepapi.node.List)
-
-    body: dict = {}
-    if is_list:
-        items = []
-        for item in note.items:
-            items.append({
-                "text": {"text": item.text},
-                "checked": item.checked,
-            })
-        body["list"] = {"listItems": items}
-    else:
-        body["text"] = {"text": note.text or ""}
+    body_serializer = _BODY_SERIALIZERS.get(type(note))
+    if body_serializer is None:
+        # テーブルにないサブクラスのみ isinstance にフォールバックする
+        body_serializer = (
+            _note_body_list if isinstance(note, gkeepapi.node.List) else _note_body_text
+        )
+    body = body_serializer(note)
 
     return {
         "name": f"notes/{note.id}",
         "title": note.title or "",
-        "createTime": note.timestamps.created.isoformat() if note.timestamps.created else "",
-        "updateTime": note.timestamps.updated.isoformat() if note.timestamps.updated else "",
+        "createTime": _iso(note.timestamps.created),
+        "updateTime": _iso(note.timestamps.updated),
         "trashed": note.trashed,
         "body": body,
     }
 
 
+def _serialize_note_bytes(note) -> bytes:
+    """
+    キャッシュを参照しつつノートを JSON バイト列にシリアライズする。
+
+    更新日時がキャッシュ時点から進んでいなければキャッシュ済みの
+    バイト列を返し、進んでいれば _serialize_note から作り直して
+    キャッシュを更新する。
+    """
+    updated = note.timestamps.updated
+    cached = _note_cache.get(note.id)
+    if cached is not None and cached[0] == updated:
+        return cached[1]
+    blob = orjson.dumps(_serialize_note(note))
+    _note_cache[note.id] = (updated, blob)
+    return blob
+
+
+# ---- 更新日時順のノートインデックス ----
+# (更新日時, ゴミ箱フラグ, アーカイブフラグ, ノート) を更新日時の降順で保持する。
+# 認証直後と同期後にのみ再構築するため、リクエスト毎の全件走査＋ソートが不要になる。
+_sorted_index: list[tuple[datetime, bool, bool, gkeepapi.node.TopLevelNode]] = []
+
+# 全ノート中で最も新しい更新日時。ETag の計算に使う。
+_max_updated: datetime | None = None
+
+
+def _rebuild_note_index(keep: gkeepapi.Keep) -> None:
+    """ソート済みインデックスを再構築し、削除されたノートのキャッシュを破棄する。"""
+    global _sorted_index, _max_updated
+    # 同期で datetime インスタンスが入れ替わるため、id() ベースのメモは無効化する
+    _iso_cache.clear()
+    index = []
+    alive = set()
+    for note in keep.all():
+        alive.add(note.id)
+        updated = note.timestamps.updated or datetime.min
+        index.append((updated, note.trashed, note.archived, note))
+    # itemgetter は C 実装で、datetime 同士の比較も C レベルで済む
+    index.sort(key=itemgetter(0), reverse=True)
+    _sorted_index = index
+    _max_updated = index[0][0] if index else None
+
+    for note_id in list(_note_cache):
+        if note_id not in alive:
+            del _note_cache[note_id]
+
+    _warm_serialize_cache(index)
+
+
+# 再シリアライズが必要なノートがこの件数を超えたらスレッドプールで温める
+_WARM_POOL_THRESHOLD = 32
+
+
+def _warm_serialize_cache(index: list) -> None:
+    """
+    同期で変化したノートをまとめて再シリアライズし、キャッシュを温める。
+
+    件数が多い場合はスレッドプールで並列化する。orjson.dumps は大きな
+    ペイロードで GIL を解放するため、複数コアで重ねられる。少量なら
+    プール起動のほうが高くつくので、リクエスト時の遅延シリアライズに任せる。
+    """
+    dirty = []
+    for _updated, _trashed, _archived, note in index:
+        cached = _note_cache.get(note.id)
+        if cached is None or cached[0] != note.timestamps.updated:
+            dirty.append(note)
+    if len(dirty) <= _WARM_POOL_THRESHOLD:
+        return
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        # 結果はキャッシュに入るので、ここでは完了を待つだけでよい
+        for _ in executor.map(_serialize_note_bytes, dirty):
+            pass
+    logger.info("%d 件のノートを再シリアライズしました", len(dirty))
+
+
+# ---- 同期の間引き ----
+# 更新ボタンの連打やポーリングの重なりで keep.sync() が連発しないよう、
+# 最低間隔を設ける。間隔内に届いた同期要求は直近の同期結果を使い回す。
+_MIN_SYNC_INTERVAL = 2.0  # 秒
+_last_sync_ts = 0.0
+_sync_done = threading.Event()
+_sync_done.set()
+
+
+def _sync_keep(keep: gkeepapi.Keep) -> bool:
+    """
+    Google Keep と同期し、インデックスと状態ファイルを更新する。
+
+    直近 _MIN_SYNC_INTERVAL 秒以内に同期が始まっていた場合は新たに
+    同期せず、進行中であれば完了を待ってから False を返す。
+    実際に同期した場合は True を返す。
+    """
+    global _last_sync_ts
+    if time.monotonic() - _last_sync_ts < _MIN_SYNC_INTERVAL:
+        _sync_done.wait(timeout=30.0)
+        return False
+    with _keep_lock:
+        # ロック待ちの間に別スレッドが同期を済ませた可能性を再確認する
+        if time.monotonic() - _last_sync_ts < _MIN_SYNC_INTERVAL:
+            return False
+        _last_sync_ts = time.monotonic()
+        _sync_done.clear()
+        try:
+            keep.sync()
+            _rebuild_note_index(keep)
+            _schedule_state_write(keep)
+        finally:
+            _sync_done.set()
+    return True
+
+
+def _notes_etag(include_trashed: bool, include_archived: bool, limit: int | None) -> str:
+    """
+    ノート一覧の弱い ETag を計算する。
+
+    最も新しい更新日時とノート総数（削除は更新日時を進めないことがある）に加え、
+    レスポンス内容を変えるクエリパラメータも含めてハッシュ化する。
+    """
+    key = f"{_max_updated}|{len(_sorted_index)}|{include_trashed}|{include_archived}|{limit}"
+    return '"%s"' % hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+
+
+def _not_modified_since(header_value: str | None) -> bool:
+    """If-Modified-Since ヘッダと最新更新日時を比較する。"""
+    if not header_value or _max_updated is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header_value)
+    except (TypeError, ValueError):
+        return False
+    # RFC 5322 の "-0000" オフセットはナイーブな datetime になるため UTC として扱う
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # gkeepapi の更新日時は UTC aware。HTTP 日付は秒精度なので丸めて比較する
+    return _max_updated.replace(microsecond=0) <= since
+
+
+def _with_cache_headers(response: Response, etag: str) -> Response:
+    """条件付きリクエスト用の ETag / Last-Modified ヘッダを付与する。"""
+    response.headers["ETag"] = etag
+    if _max_updated is not None:
+        response.headers["Last-Modified"] = http_date(_max_updated)
+    return response
+
+
 # ---- エンドポイント ----
 
 @app.route("/api/health", methods=["GET"])
@@ -125,19 +514,27 @@ def health():
     return jsonify({"status": "ok"})
 
 
-@app.route("/api/notes", methods=["GET"])
+@app.route("/api/notes", methods=["GET", "HEAD"])
 def list_notes():
     """
     Google Keep のノート一覧を返す。
 
+    HEAD リクエストにはヘッダ（ETag / Last-Modified）のみを返すため、
+    帯域の限られたクライアントは更新の有無を安価に確認できる。
+
     クエリパラメータ:
         sync (bool): true の場合、Google サーバーと同期してから返す（デフォルト: false）
         trashed (bool): true の場合、ゴミ箱のノートも含める（デフォルト: false）
         archived (bool): true の場合、アーカイブ済みノートも含める（デフォルト: false）
+        limit (int): 指定した場合、更新日時の新しい順に最大 limit 件だけ返す
 
     レスポンス:
         { "notes": [ { Note オブジェクト }, ... ] }
     """
+    # ウォームアップ中は少し待ち、間に合わなければ 503 でリトライを促す
+    if not _keep_ready.wait(timeout=5.0):
+        return _retry_later_response()
+
     try:
         keep = get_keep()
     except RuntimeError as e:
@@ -145,33 +542,58 @@ def list_notes():
         return jsonify({"error": str(e)}), 500
 
     # 同期オプション
-    do_sync = request.args.get("sync", "false").lower() == "true"
-    if do_sync:
-        logger.info("Google Keep と同期中...")
-        keep.sync()
-        # 同期後にキャッシュを保存
-        state_file = os.environ.get("KEEP_STATE_FILE", "keep_state.json")
-        with open(state_file, "w", encoding="utf-8") as f:
-            json.dump(keep.dump(), f)
-        logger.info("キャッシュを保存: %s", state_file)
+    if _bool_arg("sync"):
+        logger.debug("Google Keep と同期中...")
+        _sync_keep(keep)
 
     # フィルタオプション
-    include_trashed = request.args.get("trashed", "false").lower() == "true"
-    include_archived = request.args.get("archived", "false").lower() == "true"
-
-    notes = []
-    for note in keep.all():
-        if note.trashed and not include_trashed:
-            continue
-        if note.archived and not include_archived:
-            continue
-        notes.append(_serialize_note(note))
-
-    # 更新日時の降順でソート
-    notes.sort(key=lambda n: n.get("updateTime", ""), reverse=True)
-
-    logger.info("%d 件のノートを返します", len(notes))
-    return jsonify({"notes": notes})
+    include_trashed = _bool_arg("trashed")
+    include_archived = _bool_arg("archived")
+    limit = request.args.get("limit", type=int)
+
+    # ノートが変わっていなければボディを作らず 304 を返す（ポーリング対策）
+    # RFC 7232 に従い、If-None-Match がある場合は If-Modified-Since を無視する。
+    # ETag は削除を検知できるよう件数を含むため、更新日時だけで判定すると
+    # 削除直後に誤った 304 を返してしまう。
+    etag = _notes_etag(include_trashed, include_archived, limit)
+    # 304 にも 200 と同じ検証用ヘッダ（ETag / Last-Modified）を付ける
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        if if_none_match == etag:
+            return _with_cache_headers(Response(status=304), etag)
+    elif _not_modified_since(request.headers.get("If-Modified-Since")):
+        return _with_cache_headers(Response(status=304), etag)
+
+    # HEAD はヘッダだけ返し、シリアライズを一切行わない
+    if request.method == "HEAD":
+        return _with_cache_headers(Response(b"", mimetype="application/json"), etag)
+
+    # インデックスは更新日時の降順で構築済みなので、走査しながら
+    # フィルタするだけでよく、limit 指定時は途中で打ち切れる。
+    # 全件をメモリ上で連結せず、ノート単位のバイト列をそのままストリームする。
+    index = _sorted_index  # 同期による差し替えと競合しないようスナップショットを掴む
+
+    def generate():
+        yield b'{"notes":['
+        count = 0
+        for _updated, trashed, archived, note in index:
+            if trashed and not include_trashed:
+                continue
+            if archived and not include_archived:
+                continue
+            # limit=0 や負数でも 1 件返さないよう、yield の前に判定する
+            if limit is not None and count >= limit:
+                break
+            if count:
+                yield b","
+            yield _serialize_note_bytes(note)
+            count += 1
+        yield b"]}"
+        # ポーリングのたびに出るログなので、DEBUG かつレベルガード付きにする
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%d 件のノートを返しました", count)
+
+    return _with_cache_headers(Response(generate(), mimetype="application/json"), etag)
 
 
 @app.route("/api/notes/sync", methods=["POST"])
@@ -180,23 +602,31 @@ def sync_notes():
     Google Keep と手動で同期する。
     フロントエンドの「更新」ボタンから呼び出す。
     """
+    if not _keep_ready.wait(timeout=5.0):
+        return _retry_later_response()
+
     try:
         keep = get_keep()
     except RuntimeError as e:
         return jsonify({"error": str(e)}), 500
 
-    logger.info("手動同期リクエスト受信")
-    keep.sync()
-
-    state_file = os.environ.get("KEEP_STATE_FILE", "keep_state.json")
-    with open(state_file, "w", encoding="utf-8") as f:
-        json.dump(keep.dump(), f)
+    logger.debug("手動同期リクエスト受信")
+    _sync_keep(keep)
 
     return jsonify({"status": "synced"})
 
 
+# ウォームアップはモジュール末尾で開始する。認証後のインデックス構築など、
+# 認証パスが参照する名前がすべて定義されてからでないと NameError になる。
+threading.Thread(target=_warm_up_keep, daemon=True).start()
+
+
 if __name__ == "__main__":
+    # 本番環境ではスレッドワーカーの gunicorn を推奨:
+    #   gunicorn -k gthread --threads 8 -w 1 --bind 0.0.0.0:$PORT server:app
+    # （_keep はモジュールシングルトンのためワーカーは 1 つにすること）
+    # 直接実行した場合も threaded=True で同期中に他のリクエストを止めない
     port = int(os.environ.get("PORT", 8080))
     debug = os.environ.get("FLASK_DEBUG", "false").lower() == "true"
     logger.info("Keep G2 バックエンドサーバーを起動: port=%d, debug=%s", port, debug)
-    app.run(host="0.0.0.0", port=port, debug=debug)
+    app.run(host="0.0.0.0", port=port, debug=debug, threaded=True)